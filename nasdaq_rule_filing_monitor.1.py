@@ -7,27 +7,46 @@ asynchronous-overlap pattern (bounded concurrent cycles + parallel Discord
 posts) from your earlier script.
 """
 
-import asyncio, json, random, time
+import asyncio, functools, hashlib, html, random, re, time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, Iterable, List, Set, Tuple
 
 import aiohttp
-from selectolax.parser import HTMLParser
+import msgspec
+import orjson
+from aiohttp_socks import ProxyConnector
+from selectolax.lexbor import LexborHTMLParser
 
 # ────────────── CONFIG ─────────────────────────────────────────────────────
 CHECK_INTERVAL_SEC        = 1.0
 MAX_CONCURRENT_REQUESTS   = 5          # cycle overlap limit
 CONCURRENCY_LIMIT         = 10         # max simultaneous HTTP ops inside a run
-STATE_FILE                = Path("known_rows.json")
+HEAD_PROBE                = True       # HEAD + ETag check before a full GET
+RULEFILINGS_URL           = (
+    "https://listingcenter.nasdaq.com/rulebook/nasdaq/rulefilings"
+)
+STATE_FILE                = Path("known_rows.jsonl")  # one row ID per line
+LEGACY_STATE_FILE         = Path("known_rows.json")   # old sorted JSON array
+SAVE_FLUSH_SEC            = 1.0        # window for coalescing state writes
 
 DISCORD_BOT_TOKEN         = (
     "MTI4NTI0NjExMzU2NTI0OTYzMQ.GVB7mn."
     "BZzO9Pd5HuaISXEy_rtpa1bHuQ8mszXDxY9MfI"
 )
 DISCORD_CHANNEL_ID        = "1069624139649912882"
+DISCORD_MSG_LIMIT         = 1900       # Discord rejects content over 2000 chars
+DISCORD_URL               = (
+    f"https://discord.com/api/v10/channels/{DISCORD_CHANNEL_ID}/messages"
+)
+DISCORD_HDR: Dict[str, str] = {
+    "Authorization": f"Bot {DISCORD_BOT_TOKEN}",
+    "Content-Type": "application/json",
+}
 
-IPROYAL_ENDPOINT          = "geo.iproyal.com:12321"
+IPROYAL_ENDPOINT          = "geo.iproyal.com:12321"   # HTTP(S) proxy port
+IPROYAL_SOCKS_ENDPOINT    = "geo.iproyal.com:32325"   # SOCKS5 port, unverified
+USE_SOCKS5                = False      # True: persistent SOCKS5 upstream
 IPROYAL_AUTH              = "dFxlOFzx7ob6oWMx:Rz471juID8qR9AXY"
 
 BASE_HEADERS: Dict[str, str] = {
@@ -42,22 +61,38 @@ BASE_HEADERS: Dict[str, str] = {
     "referer": "https://listingcenter.nasdaq.com/",
 }
 
-USER_AGENTS = [ln.strip() for ln in open("user-agents.txt", encoding="utf-8")
-               if ln.strip()]
+USER_AGENTS_FILE = Path("user-agents.txt")
+
+@functools.lru_cache(maxsize=1)
+def _load_user_agents() -> tuple[str, ...]:
+    try:
+        text = USER_AGENTS_FILE.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return ("Mozilla/5.0",)
+    uas = tuple(ln.strip() for ln in text.splitlines() if ln.strip())
+    return uas or ("Mozilla/5.0",)
+
+# one complete header dict per UA, built once; shared, so never mutate them
+@functools.lru_cache(maxsize=1)
+def _header_pool() -> tuple[Dict[str, str], ...]:
+    return tuple({**BASE_HEADERS, "user-agent": ua}
+                 for ua in _load_user_agents())
 
 def rnd_headers() -> Dict[str, str]:
-    return {**BASE_HEADERS, "user-agent": random.choice(USER_AGENTS)}
+    return random.choice(_header_pool())
 
 def proxy_url() -> str:
+    if USE_SOCKS5:
+        return f"socks5://{IPROYAL_AUTH}@{IPROYAL_SOCKS_ENDPOINT}"
     return f"http://{IPROYAL_AUTH}@{IPROYAL_ENDPOINT}"
 
 # ────────────── COOKIE BOOTSTRAP ───────────────────────────────────────────
 async def bootstrap_cookies(sess: aiohttp.ClientSession,
-                            hdrs: dict, proxy: str) -> Dict[str, str] | None:
+                            hdrs: dict) -> Dict[str, str] | None:
     try:
         async with sess.head(
             "https://listingcenter.nasdaq.com/rulebook/nasdaq",
-            headers=hdrs, proxy=proxy, timeout=10
+            headers=hdrs, timeout=10
         ) as r:
             r.raise_for_status()
             return {k: m.value for k, m in r.cookies.items()}
@@ -66,74 +101,295 @@ async def bootstrap_cookies(sess: aiohttp.ClientSession,
         return None
 
 # ────────────── HTML FETCH & PARSE ─────────────────────────────────────────
-async def get_html(sess: aiohttp.ClientSession, hdrs: dict,
-                   proxy: str, cookies=None) -> str | None:
+class Row(msgspec.Struct, frozen=True, gc=False):
+    id:          str                   # e.g. SR-NASDAQ-2025-001
+    description: str
+
+NOT_MODIFIED = object()                # get_html_bytes() result on HTTP 304
+
+# change-detection state: validators + body hash of the last parsed 200 and
+# the rows from it, always set together so a 304 can only mean "these rows"
+# (servers that ignore conditional GETs still skip the parse via the hash)
+_last_etag:     str | None = None
+_last_modified: str | None = None
+_last_hash:     bytes | None = None
+_last_rows:     List[Row] = []
+
+# year-dependent strings, rebuilt only when the (local) year rolls over
+_YEAR:      int   = 0
+_YEAR_ENDS: float = 0.0
+_YEAR_MARK: bytes = b""
+_TAB_ID:    bytes = b""
+_TABLE_SEL: str   = ""
+
+def current_year() -> int:
+    global _YEAR, _YEAR_ENDS, _YEAR_MARK, _TAB_ID, _TABLE_SEL
+    if time.time() >= _YEAR_ENDS:
+        y = datetime.now().year
+        _YEAR, _YEAR_ENDS = y, datetime(y + 1, 1, 1).timestamp()
+        _YEAR_MARK = f"NASDAQ-tab-{y}".encode()
+        _TAB_ID    = f'id="NASDAQ-tab-{y}"'.encode()
+        _TABLE_SEL = f"#NASDAQ-tab-{y} > table"
+    return _YEAR
+
+_desc_col: int | None = None           # "Description" column, checked once
+
+def description_column(table) -> int:
+    """Index of the Description cell, read from the header row on first use."""
+    global _desc_col
+    if _desc_col is None:
+        heads     = [th.text(strip=True) for th in table.css("th")]
+        _desc_col = heads.index("Description") if "Description" in heads else 1
+    return _desc_col
+
+def parse_rows(body: bytes) -> List[Row] | None:
+    table = LexborHTMLParser(body).css_first(_TABLE_SEL)
+    if table is None:
+        return None
+
+    col  = description_column(table)
+    rows = []
+    for tr in table.css("tr[id]"):
+        tds = [c for c in tr.iter() if c.tag == "td"]     # one child walk
+        rows.append(Row(id=tr.attributes["id"],
+                        description=tds[col].text(strip=True)
+                                    if len(tds) > col else ""))
+    return rows
+
+# fast path: rows have a fixed shape, so one bytes regex lifts them out
+ROW_RE   = re.compile(rb'<tr\s+id="(SR-NASDAQ-\d{4}-\d+)"\s*>\s*'
+                      rb'<td[^>]*>.*?</td>\s*<td[^>]*>(.*?)</td>', re.S)
+TR_ID_RE = re.compile(rb'<tr\b[^>]*\sid=')
+TAG_RE   = re.compile(r"<[^>]*>")
+
+def _cell_text(raw: bytes) -> str:
+    # same as selectolax's text(strip=True): strip each text node, then join
+    return "".join(html.unescape(t).strip()
+                   for t in TAG_RE.split(raw.decode("utf-8", "replace")))
+
+def scan_rows(body: bytes) -> List[Row] | None:
+    """Regex row extraction; None whenever the page needs the real parser."""
+    if _desc_col != 1:                     # header not verified by parse_rows
+        return None
+    start = body.find(_TAB_ID)
+    end   = body.find(b"</table>", start)
+    if start < 0 or end < 0:
+        return None
+
+    section = body[start:end]
+    rows = [Row(id=m[1].decode(), description=_cell_text(m[2]))
+            for m in ROW_RE.finditer(section)]
+    if not rows or len(rows) != len(TR_ID_RE.findall(section)):
+        return None                        # some row has an unexpected shape
+    return rows
+
+Page = Tuple[bytes, str | None, str | None]    # body, ETag, Last-Modified
+
+async def get_html_bytes(sess: aiohttp.ClientSession, hdrs: dict,
+                         cookies=None,
+                         conditional: bool = True) -> Page | object | None:
+    if conditional and _last_rows:     # only revalidate when we can reuse rows
+        hdrs = dict(hdrs)
+        if _last_etag:
+            hdrs["if-none-match"] = _last_etag
+        if _last_modified:
+            hdrs["if-modified-since"] = _last_modified
     try:
         async with sess.get(
-            "https://listingcenter.nasdaq.com/rulebook/nasdaq/rulefilings",
-            headers=hdrs, proxy=proxy, cookies=cookies, timeout=20
+            RULEFILINGS_URL, headers=hdrs, cookies=cookies, timeout=20
         ) as r:
+            if r.status == 304:
+                return NOT_MODIFIED
             r.raise_for_status()
-            return await r.text()
+            body = await r.read()          # parser takes bytes; skip decode
+            return body, r.headers.get("ETag"), r.headers.get("Last-Modified")
     except Exception as exc:
         print(f"❌ download failed: {exc}")
         return None
 
-async def fetch_table(sess: aiohttp.ClientSession) -> List[dict]:
-    year  = datetime.now().year
+async def probe_etag(sess: aiohttp.ClientSession, hdrs: dict) -> str | None:
+    try:
+        async with sess.head(
+            RULEFILINGS_URL, headers=hdrs, timeout=10
+        ) as r:
+            r.raise_for_status()
+            return r.headers.get("ETag")
+    except Exception as exc:
+        print(f"⚠️ head probe failed: {exc}")
+        return None
+
+async def fetch_table(sess: aiohttp.ClientSession) -> List[Row]:
+    global _last_etag, _last_modified, _last_hash, _last_rows
+    year  = current_year()
     hdrs  = rnd_headers()
-    proxy = proxy_url()
+
+    # cheap HEAD first: an unchanged ETag means the cached rows still hold.
+    # Snapshot the pair, since another cycle may replace both while we wait.
+    rows_etag, rows = _last_etag, _last_rows
+    if HEAD_PROBE and rows and rows_etag:
+        if await probe_etag(sess, hdrs) == rows_etag:
+            return rows
 
     # optimistic pass
-    html = await get_html(sess, hdrs, proxy)
-    if html is None or f"NASDAQ-tab-{year}" not in html:
-        cookies = await bootstrap_cookies(sess, hdrs, proxy)
-        html    = await get_html(sess, hdrs, proxy, cookies)
-        if html is None:
+    page = await get_html_bytes(sess, hdrs)
+    if page is NOT_MODIFIED:
+        return _last_rows
+    if page is None or _YEAR_MARK not in page[0]:
+        cookies = await bootstrap_cookies(sess, hdrs)
+        # unconditional: an overlapping cycle may have cached rows meanwhile
+        page    = await get_html_bytes(sess, hdrs, cookies, conditional=False)
+        if page is None:
             return []
 
-    root  = HTMLParser(html)
-    table = root.css_first(f"#NASDAQ-tab-{year} > table")
-    if table is None:
+    body, etag, modified = page
+    digest = hashlib.blake2b(body, digest_size=16).digest()
+    if digest == _last_hash and _last_rows:
+        _last_etag, _last_modified = etag, modified     # same body, same rows
+        return _last_rows
+
+    rows = scan_rows(body)
+    if rows is None:
+        rows = parse_rows(body)
+    if rows is None:
         print("⚠️ no <table> in page")
         return []
 
-    rows = [{"id": tr.attributes["id"],
-             "description": (tr.css_first('td[data-title="Description"]')
-                              or tr.css("td")[1]).text(strip=True)}
-            for tr in table.css("tr[id]")]
     print(f"Fetched {len(rows)} rows for year {year}.")
+    _last_hash, _last_rows = digest, rows
+    _last_etag, _last_modified = etag, modified
     return rows
 
 # ────────────── STATE PERSISTENCE ──────────────────────────────────────────
+def _write_known(ids: Iterable[str], mode: str) -> None:
+    with STATE_FILE.open(mode, encoding="utf-8") as fp:
+        fp.write("".join(f"{i}\n" for i in ids))
+
 async def load_known() -> Set[str]:
     try:
-        return set(json.loads(STATE_FILE.read_text()))
+        lines = STATE_FILE.read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        try:                               # one-off import of the JSON state
+            known = set(orjson.loads(LEGACY_STATE_FILE.read_bytes()))
+        except Exception:
+            return set()
+        _write_known(sorted(known), "w")
+        return known
     except Exception:
         return set()
 
-async def save_known(ids: Set[str]) -> None:
-    STATE_FILE.write_text(json.dumps(sorted(ids)))
+    known = {ln for ln in lines if ln}
+    if len(known) != len(lines):           # compact duplicates from overlaps
+        _write_known(sorted(known), "w")
+    return known
 
-# ────────────── DISCORD (BOT TOKEN) ────────────────────────────────────────
-async def push_discord(row: dict, sess: aiohttp.ClientSession) -> None:
-    ts  = datetime.now(timezone.utc).isoformat()
-    msg = f"🆕 **{row['id']}**\n> {row['description']}\nDetected: `{ts}`"
+async def append_known(ids: Iterable[str]) -> None:
+    await asyncio.to_thread(_write_known, list(ids), "a")  # keep loop free
 
-    url = f"https://discord.com/api/v10/channels/{DISCORD_CHANNEL_ID}/messages"
-    hdr = {"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
+save_queue: "asyncio.Queue[str]" = asyncio.Queue()
+
+async def save_worker() -> None:
+    """Append queued IDs to STATE_FILE, one write per SAVE_FLUSH_SEC window."""
+    loop  = asyncio.get_running_loop()
+    batch: List[str] = []
     try:
-        async with sess.post(url, json={"content": msg}, headers=hdr,
-                             timeout=10) as r:
-            r.raise_for_status()
-            print(f"✅ pushed {row['id']}")
-    except Exception as exc:
-        print(f"❌ discord failed: {exc}")
+        while True:
+            if not batch:                  # a failed batch retries at once
+                batch.append(await save_queue.get())
+            deadline = loop.time() + SAVE_FLUSH_SEC
+            while (left := deadline - loop.time()) > 0:
+                try:
+                    batch.append(await asyncio.wait_for(save_queue.get(), left))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await append_known(batch)
+            except OSError as exc:         # keep the batch; the window backs off
+                print(f"❌ state write failed ({len(batch)} IDs kept): {exc}")
+                continue
+            batch = []
+    finally:                               # flush what is left on shutdown
+        while not save_queue.empty():
+            batch.append(save_queue.get_nowait())
+        if batch:
+            try:
+                _write_known(batch, "a")
+            except OSError as exc:
+                print(f"❌ state write failed, {len(batch)} IDs lost: {exc}")
+
+def saver_exited(task: asyncio.Task) -> None:
+    if not task.cancelled():               # it only ever ends by cancellation
+        print(f"❌ state writer stopped: {task.exception()!r} "
+              "– new IDs are no longer saved")
+
+# ────────────── DISCORD (BOT TOKEN) ────────────────────────────────────────
+def discord_messages(rows: List[Row]) -> List[Tuple[str, List[Row]]]:
+    """Pack rows into as few messages as fit under DISCORD_MSG_LIMIT.
+
+    Each message comes with the rows it carries.
+    """
+    ts   = datetime.now(timezone.utc).isoformat()
+    foot = f"\nDetected: `{ts}`"
+    room = DISCORD_MSG_LIMIT - len(foot)
+
+    msgs: List[Tuple[str, List[Row]]] = []
+    cur, carried = "", []
+    for row in rows:
+        block = f"🆕 **{row.id}**\n> {row.description}"[:room]
+        if cur and len(cur) + 1 + len(block) > room:
+            msgs.append((cur + foot, carried))
+            cur, carried = block, [row]
+        else:
+            cur = f"{cur}\n{block}" if cur else block
+            carried.append(row)
+    if cur:
+        msgs.append((cur + foot, carried))
+    return msgs
+
+async def push_discord(rows: List[Row],
+                       discord_sess: aiohttp.ClientSession) -> List[Row]:
+    """Post every message, in order; return the rows that reached Discord."""
+    delivered: List[Row] = []
+    for msg, carried in discord_messages(rows):
+        try:
+            async with discord_sess.post(
+                DISCORD_URL, data=orjson.dumps({"content": msg}),
+                headers=DISCORD_HDR, timeout=10
+            ) as r:
+                r.raise_for_status()
+        except Exception as exc:           # keep going; only these rows retry
+            print(f"❌ discord failed for {len(carried)} rows: {exc}")
+            continue
+        delivered.extend(carried)
+    if delivered:
+        print(f"✅ pushed {', '.join(row.id for row in delivered)}")
+    return delivered
 
 # ────────────── ONE CYCLE ──────────────────────────────────────────────────
 HTTP_SEMAPHORE = asyncio.Semaphore(CONCURRENCY_LIMIT)
 
-async def cycle(sess: aiohttp.ClientSession, known: Set[str]) -> None:
+# rows list / ID set of the last diff against `known`; fetch_table hands back
+# the very same list while the page is unchanged
+_diffed_rows: List[Row] | None = None
+_last_ids:    frozenset[str]    = frozenset()
+
+def new_rows(rows: List[Row], known: Set[str]) -> List[Row]:
+    global _diffed_rows, _last_ids
+    if rows is _diffed_rows:
+        return []
+    _diffed_rows = rows
+    ids = frozenset(r.id for r in rows)
+    if ids == _last_ids:
+        return []
+    _last_ids = ids
+    return [r for r in rows if r.id not in known]
+
+def forget_diff() -> None:
+    """Make the next cycle diff again, e.g. to retry undelivered rows."""
+    global _diffed_rows, _last_ids
+    _diffed_rows, _last_ids = None, frozenset()
+
+async def cycle(sess: aiohttp.ClientSession,
+                discord_sess: aiohttp.ClientSession, known: Set[str]) -> None:
     async with HTTP_SEMAPHORE:            # cap parallel network ops
         t0   = time.perf_counter()
         rows = await fetch_table(sess)
@@ -143,31 +399,81 @@ async def cycle(sess: aiohttp.ClientSession, known: Set[str]) -> None:
         print(f"⚠️ zero rows (t {dt:.2f}s)")
         return
 
-    fresh = [r for r in rows if r["id"] not in known]
+    fresh = new_rows(rows, known)
     if not fresh:
         print(datetime.utcnow().strftime("%H:%M:%S"), f"– no new (t {dt:.2f}s)")
         return
 
-    # parallel Discord pushes
-    tasks = [asyncio.create_task(push_discord(r, sess)) for r in reversed(fresh)]
-    await asyncio.gather(*tasks)
+    # batched Discord posts, oldest filing first; only delivered rows count
+    sent = await push_discord(fresh[::-1], discord_sess)
+    if len(sent) < len(fresh):
+        forget_diff()
 
-    known.update(r["id"] for r in fresh)
-    await save_known(known)
-    print(f"🔍 {len(fresh)} new rows (t {dt:.2f}s)")
+    known.update(r.id for r in sent)
+    for r in sent:                        # persisted by save_worker()
+        save_queue.put_nowait(r.id)
+    print(f"🔍 {len(fresh)} new rows, {len(sent)} pushed (t {dt:.2f}s)")
 
 # ────────────── DRIVER ─────────────────────────────────────────────────────
+class Admission:
+    """Counter + Condition cycle limiter; unlike a Semaphore it can be resized."""
+
+    def __init__(self, limit: int) -> None:
+        self.active = 0
+        self.limit  = limit
+        self.cond   = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def release(self) -> None:
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify(1)
+
+    async def set_limit(self, limit: int) -> None:
+        async with self.cond:
+            self.limit = limit
+            self.cond.notify_all()         # a raised limit may admit several
+
+async def guarded_cycle(limiter: Admission, sess: aiohttp.ClientSession,
+                        discord_sess: aiohttp.ClientSession,
+                        known: Set[str]) -> None:
+    try:
+        await cycle(sess, discord_sess, known)
+    except Exception as exc:               # surface it; nobody awaits the task
+        print(f"❌ cycle failed: {exc}")
+    finally:                               # hold the slot for the whole cycle
+        await limiter.release()
+
 async def main_async() -> None:
     known   = await load_known()
-    limiter = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = Admission(MAX_CONCURRENT_REQUESTS)
+    saver   = asyncio.create_task(save_worker())   # held so it is not GC-ed
+    saver.add_done_callback(saver_exited)
+    running: Set[asyncio.Task] = set()     # likewise for in-flight cycles
 
-    async with aiohttp.ClientSession(
-            connector=aiohttp.TCPConnector(ssl=False, limit=None)) as sess:
+    # scraping goes through the HTTP proxy (or one persistent SOCKS5 upstream
+    # when USE_SOCKS5 is on); Discord gets its own small keep-alive pool, direct
+    if USE_SOCKS5:
+        scrape_kw = {"connector": ProxyConnector.from_url(
+            proxy_url(), ssl=False, limit=None)}
+    else:                                  # session-level proxy: aiohttp>=3.11
+        scrape_kw = {"connector": aiohttp.TCPConnector(ssl=False, limit=None),
+                     "proxy": proxy_url()}
+    discord_conn = aiohttp.TCPConnector(limit=4, keepalive_timeout=75)
+    async with aiohttp.ClientSession(**scrape_kw) as sess, \
+               aiohttp.ClientSession(connector=discord_conn) as discord_sess:
         print(f"🔄 monitor – every {CHECK_INTERVAL_SEC}s (full-async, IPRoyal)")
         while True:
             # allow overlap up to MAX_CONCURRENT_REQUESTS cycles
-            async with limiter:
-                asyncio.create_task(cycle(sess, known))
+            await limiter.acquire()
+            task = asyncio.create_task(
+                guarded_cycle(limiter, sess, discord_sess, known))
+            running.add(task)
+            task.add_done_callback(running.discard)
             await asyncio.sleep(CHECK_INTERVAL_SEC)
 
 def main() -> None:
@@ -14,7 +14,7 @@ from pathlib import Path
 from typing import Dict, List
 
 import requests
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 
 # ──────────── SETTINGS ─────────────────────────────────────────────────────
 CHECK_INTERVAL_SEC = 60          # poll frequency; 60 s keeps load tiny but fast
@@ -107,22 +107,19 @@ def fetch_table(session: requests.Session) -> List[dict]:
     )
     resp.raise_for_status()
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    table = soup.select_one(f"#NASDAQ-tab-{year} > table")
-    if not table:
+    tree = LexborHTMLParser(resp.content)
+    table = tree.css_first(f"#NASDAQ-tab-{year} > table")
+    if table is None:
         raise RuntimeError(f"Rule table for year {year} not found!")
 
     rows = []
-    for tr in table.find_all("tr", id=True):
+    for tr in table.css("tr[id]"):
         # ID looks like SR-NASDAQ-2025-001
-        row_id = tr["id"].strip()
-        desc_cell = tr.find("td", attrs={"data-title": "Description"})
-        if not desc_cell:  # Fallback: assume second cell is description
-            tds = tr.find_all("td")
-            desc_cell = tds[1] if len(tds) > 1 else None
+        row_id = tr.attributes["id"].strip()
+        tds = tr.css("td")  # second cell is the description
         description = (
-            desc_cell.get_text(strip=True).replace("\xa0", " ")
-            if desc_cell else ""
+            tds[1].text(strip=True).replace("\xa0", " ")
+            if len(tds) > 1 else ""
         )
         rows.append({"id": row_id, "description": description})
     print(f"Fetched {len(rows)} rows for year {year}.")
@@ -138,20 +135,138 @@ def load_known_ids() -> set:
     return set()
 
 # test_monitor.py
-from pathlib import Path
-from bs4 import BeautifulSoup
-from nasdaq_rule_filing_monitor import fetch_table
-
-def test_parse_local():
-    html = Path("sample.html").read_text(encoding="utf-8")
-    soup = BeautifulSoup(html, "html.parser")
-    # monkey-patch BeautifulSoup so fetch_table thinks it just downloaded the page
-    import types, requests
+import asyncio
+import functools
+import importlib.util
+import types
+
+HERE = Path(__file__).resolve().parent
+
+
+def _pinned_year(year: int) -> type:
+    """datetime whose now() falls in `year`; sample.html was saved in 2025."""
+
+    class _Pinned(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(year, 6, 3, tzinfo=tz)
+
+    return _Pinned
+
+
+@functools.lru_cache(maxsize=1)
+def load_monitor() -> types.ModuleType:
+    """Import the async monitor, whose file name is not a valid module name."""
+    spec = importlib.util.spec_from_file_location(
+        "nasdaq_rule_filing_monitor", HERE / "nasdaq_rule_filing_monitor.1.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes = b"", status: int = 200):
+        self.status, self.headers, self.cookies = status, {}, {}
+        self._body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    async def read(self):
+        return self._body
+
+
+def test_parse_local(monkeypatch):
+    monkeypatch.setitem(globals(), "datetime", _pinned_year(2025))
+    html = (HERE / "sample.html").read_text(encoding="utf-8")
+    # fake session so fetch_table thinks it just downloaded the page
     fake_session = types.SimpleNamespace(get=lambda *a, **k: types.SimpleNamespace(
-        text=html, raise_for_status=lambda: None))
+        text=html, content=html.encode("utf-8"), raise_for_status=lambda: None))
     rows = fetch_table(fake_session)
     assert len(rows) >= 1, "Parser failed – no rows found"
 
+
+def test_monitor_fetch_table(monkeypatch):
+    monitor = load_monitor()
+    monkeypatch.setattr(monitor, "datetime", _pinned_year(2025))
+    monkeypatch.setattr(monitor, "_YEAR_ENDS", 0.0)
+    monkeypatch.setattr(monitor, "_last_rows", [])
+    body = (HERE / "sample.html").read_bytes()
+    fake_session = types.SimpleNamespace(get=lambda *a, **k: _FakeResponse(body))
+    rows = asyncio.run(monitor.fetch_table(fake_session))
+    assert rows and all(r.id.startswith("SR-NASDAQ-2025-") for r in rows)
+    assert monitor.rnd_headers()["user-agent"]
+
+
+def test_scan_rows_matches_parse_rows(monkeypatch):
+    monitor = load_monitor()
+    body = (HERE / "sample.html").read_bytes()
+    for year in range(2012, 2026):             # every tab saved in sample.html
+        monkeypatch.setattr(monitor, "datetime", _pinned_year(year))
+        monkeypatch.setattr(monitor, "_YEAR_ENDS", 0.0)
+        monkeypatch.setattr(monitor, "_desc_col", None)
+        assert monitor.current_year() == year
+
+        parsed = monitor.parse_rows(body)      # also verifies the header row
+        scanned = monitor.scan_rows(body)
+        assert parsed, f"no rows parsed for {year}"
+        assert scanned == parsed, f"regex fast path disagrees for {year}"
+
+
+def test_discord_messages_packing():
+    monitor = load_monitor()
+    rows = [monitor.Row(id=f"SR-NASDAQ-2025-{i:03d}", description="x" * (i * 37))
+            for i in range(1, 80)]                 # last ones exceed the limit
+    msgs = monitor.discord_messages(rows)
+
+    assert len(msgs) > 1
+    assert all(len(msg) <= monitor.DISCORD_MSG_LIMIT for msg, _ in msgs)
+    assert [r for _, carried in msgs for r in carried] == rows
+
+
+def test_cycle_retries_undelivered_rows(monkeypatch):
+    monitor = load_monitor()
+    monkeypatch.setattr(monitor, "datetime", _pinned_year(2025))
+    monkeypatch.setattr(monitor, "_YEAR_ENDS", 0.0)
+    for name, value in (("_last_rows", []), ("_last_hash", None),
+                        ("_last_etag", None), ("_last_modified", None),
+                        ("_diffed_rows", None), ("_last_ids", frozenset())):
+        monkeypatch.setattr(monitor, name, value)
+    monkeypatch.setattr(monitor, "save_queue", asyncio.Queue())
+
+    body = (HERE / "sample.html").read_bytes()
+    scrape = types.SimpleNamespace(get=lambda *a, **k: _FakeResponse(body))
+    posted, fail_at = [], {2}                      # 2nd POST overall gets a 500
+
+    def post(*a, data, **k):
+        posted.append(json.loads(data)["content"])
+        return _FakeResponse(status=500 if len(posted) in fail_at else 200)
+
+    discord = types.SimpleNamespace(post=post)
+    known: set = set()
+
+    asyncio.run(monitor.cycle(scrape, discord, known))
+    rows = monitor.parse_rows(body)
+    lost = {r.id for r in rows} - known
+    assert lost and all(rid not in known for rid in lost)
+    assert monitor.save_queue.qsize() == len(known)
+
+    first_round = len(posted)                      # page unchanged, yet retried
+    asyncio.run(monitor.cycle(scrape, discord, known))
+    assert known == {r.id for r in rows}
+    assert all(any(rid in msg for msg in posted[first_round:]) for rid in lost)
+
+    second_round = len(posted)                     # now nothing left to send
+    asyncio.run(monitor.cycle(scrape, discord, known))
+    assert len(posted) == second_round
+
 def save_known_ids(ids: set) -> None:
     with STATE_FILE.open("w") as fp:
         json.dump(sorted(ids), fp)